@@ -1,6 +1,9 @@
 # database.py
+from sqlalchemy import event, text
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
+import asyncio
 import os
 
 
@@ -14,11 +17,27 @@ DATABASE_URL = os.getenv(
 # Create async engine
 engine = create_async_engine(
     DATABASE_URL,
-    echo=True,  # Set to False in production
-    future=True
+    echo=os.getenv("SQL_ECHO") == "1",  # Set SQL_ECHO=1 to log statements
+    future=True,
+    query_cache_size=1200,
+    pool_pre_ping=True
 )
 
 
+if DATABASE_URL.startswith("sqlite"):
+    @event.listens_for(engine.sync_engine, "connect")
+    def _set_sqlite_pragmas(dbapi_connection, connection_record):
+        """Per-connection SQLite tuning: FK enforcement, WAL, larger page cache"""
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA foreign_keys=ON")
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.execute("PRAGMA mmap_size=268435456")
+        cursor.execute("PRAGMA cache_size=-65536")
+        cursor.execute("PRAGMA temp_store=MEMORY")
+        cursor.close()
+
+
 # Create session factory
 async_session = async_sessionmaker(
     engine,
@@ -35,20 +54,48 @@ from collections.abc import AsyncGenerator
 
 
 async def get_db() -> AsyncGenerator[AsyncSession, None]:
-    """Dependency to get database session"""
+    """Dependency to get database session (endpoints commit their own writes)"""
     async with async_session() as session:
         try:
             yield session
-            await session.commit()
         except Exception:
             await session.rollback()
             raise
         finally:
             await session.close()
-            
-async def create_tables():
-    """Create all tables"""
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+
+
+def _sync_indexes(connection):
+    """
+    create_all skips tables that already exist, so bring indexes on
+    existing databases in line with the models here.
+    Only indexes are reconciled: table constraints such as
+    ck_questions_status cannot be added to an existing SQLite table
+    in place, so older databases keep an unconstrained status column
+    until the table is rebuilt.
+    """
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(connection, checkfirst=True)
+    # Superseded by ix_questions_doc_created
+    connection.execute(text("DROP INDEX IF EXISTS ix_questions_document_id"))
+
+
+async def create_tables(attempts: int = 5):
+    """
+    Create all tables and any missing indexes. Safe to call from several
+    worker processes at once: if another worker creates the schema between
+    our existence check and CREATE, retry and let checkfirst see it.
+    """
+    for attempt in range(1, attempts + 1):
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(Base.metadata.create_all)
+                await conn.run_sync(_sync_indexes)
+            return
+        except DBAPIError:
+            if attempt == attempts:
+                raise
+            await asyncio.sleep(0.2 * attempt)
 
 __all__ = ["get_db", "create_tables", "async_session", "Base"]
\ No newline at end of file
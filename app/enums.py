@@ -1,7 +1,8 @@
-import enum
+from typing import Final, Literal
 
-class QuestionStatus(enum.Enum):
-    """Enumeration for question processing status"""
-    PENDING = "pending"
-    ANSWERED = "answered"
-    ERROR = "error"
+# Question processing status values, stored as plain strings
+PENDING: Final = "pending"
+ANSWERED: Final = "answered"
+ERROR: Final = "error"
+
+QuestionStatus = Literal["pending", "answered", "error"]
@@ -1,14 +1,8 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Text, DateTime, ForeignKey, CheckConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from .database import Base  # Use Base from database.py
-import enum
-
-class QuestionStatus(enum.Enum):
-    """Enumeration for question processing status"""
-    PENDING = "pending"
-    ANSWERED = "answered"
-    ERROR = "error"
+from .enums import PENDING
 
 # Your Document and Question models remain exactly the same
 class Document(Base):
@@ -26,11 +20,17 @@ class Question(Base):
     __tablename__ = "questions"
     
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False, index=True)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="CASCADE"), nullable=False)
     question = Column(Text, nullable=False)
     answer = Column(Text, nullable=True)
-    status = Column(String, default=QuestionStatus.PENDING.value)
+    status = Column(String, default=PENDING)
     created_at = Column(DateTime(timezone=True), server_default=func.now(), nullable=False, index=True)
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), nullable=True)
     
     document = relationship("Document", back_populates="questions", lazy="select")
+    
+    __table_args__ = (
+        CheckConstraint("status IN ('pending', 'answered', 'error')", name="ck_questions_status"),
+        # Serves "questions for a document, newest first" straight from the index
+        Index("ix_questions_doc_created", "document_id", created_at.desc()),
+    )
@@ -1,16 +1,18 @@
-from fastapi import APIRouter, HTTPException, Depends, Form, status
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Depends, Form, status
 from fastapi.responses import JSONResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, delete
-from typing import List, Optional
+from sqlalchemy import select, delete, func, bindparam, RowMapping
+from sqlalchemy.exc import IntegrityError
+from typing import BinaryIO, List, Optional, Sequence
+from collections import OrderedDict
 import asyncio
+import hashlib
 import logging
 from fastapi import UploadFile, File
-import PyPDF2, docx, io
 
-from .database import get_db
+from .database import get_db, async_session
 from .models import Document, Question
-from .enums import QuestionStatus
+from .enums import PENDING, ANSWERED, ERROR
 from .schemas import (
     DocumentCreate, 
     DocumentResponse, 
@@ -22,51 +24,103 @@ from .schemas import (
 # Configure logging
 logger = logging.getLogger(__name__)
 
-# Background task storage for tracking async operations
-background_tasks = {}
-
 # Create routers for different resource groups
 documents_router = APIRouter(prefix="/documents", tags=["documents"])
 questions_router = APIRouter(prefix="/questions", tags=["questions"])
 health_router = APIRouter(prefix="/health", tags=["health"])
 
-async def process_question_async(question_id: int, question_text: str, db_session_factory):
+# Statements built once at import and reused, so each request skips
+# rebuilding the expression tree before the compiled-cache lookup.
+# Primary-key lookups go through AsyncSession.get instead.
+STMT_QUESTIONS_BY_DOC = (
+    select(
+        Question.id,
+        Question.document_id,
+        Question.question,
+        Question.answer,
+        Question.status,
+        Question.created_at,
+        Question.updated_at
+    )
+    .where(Question.document_id == bindparam("document_id"))
+    .order_by(Question.created_at.desc())
+)
+STMT_DOCUMENT_EXISTS = select(Document.id).where(Document.id == bindparam("document_id"))
+STMT_COUNTS = select(
+    select(func.count(Document.id)).scalar_subquery(),
+    select(func.count(Question.id)).scalar_subquery()
+)
+STMT_PING = select(1)
+# Single round-trip delete; the returned id tells us whether the row existed
+STMT_DELETE_QUESTION = (
+    delete(Question)
+    .where(Question.id == bindparam("question_id"))
+    .returning(Question.id)
+    .execution_options(synchronize_session=False)
+)
+
+# LRU cache of generated answers, keyed by document and exact question text.
+# Documents are never modified once uploaded, so entries don't go stale.
+ANSWER_CACHE_SIZE = 1024
+answer_cache: "OrderedDict[bytes, str]" = OrderedDict()
+
+
+def _answer_cache_key(document_id: int, question_text: str) -> bytes:
+    """Hash the document id and question text into a compact cache key"""
+    return hashlib.blake2b(
+        f"{document_id}:{question_text}".encode(), digest_size=16
+    ).digest()
+
+
+def _is_foreign_key_violation(error: IntegrityError) -> bool:
+    """True if the integrity error came from a foreign key (SQLSTATE 23503 / SQLite message)"""
+    orig = error.orig
+    return getattr(orig, "sqlstate", None) == "23503" or "FOREIGN KEY" in str(orig).upper()
+
+
+async def process_question_async(question_id: int, document_id: int, question_text: str, db_session_factory):
     """
     Async background task to simulate LLM processing.
+    Answers are memoized so repeated questions skip the LLM call.
     """
     try:
         logger.info(f"Starting background processing for question {question_id}")
         
-        # Simulate LLM processing time
-        await asyncio.sleep(5)
+        cache_key = _answer_cache_key(document_id, question_text)
+        answer = answer_cache.get(cache_key)
         
-        # Generate dummy LLM response
-        answer = f"This is a generated answer to your question: {question_text}"
+        if answer is not None:
+            answer_cache.move_to_end(cache_key)
+            logger.info(f"Answer cache hit for question {question_id}")
+        else:
+            # Simulate LLM processing time
+            await asyncio.sleep(5)
+            
+            # Generate dummy LLM response
+            answer = f"This is a generated answer to your question: {question_text}"
+            
+            answer_cache[cache_key] = answer
+            if len(answer_cache) > ANSWER_CACHE_SIZE:
+                answer_cache.popitem(last=False)
         
         # Update question with answer using a new database session
         async with db_session_factory() as db:
             try:
                 # Get the question
-                result = await db.execute(
-                    select(Question).where(Question.id == question_id)
-                )
-                question = result.scalar_one_or_none()
+                question = await db.get(Question, question_id)
                 
                 if question:
                     question.answer = answer
-                    question.status = QuestionStatus.ANSWERED.value
+                    question.status = ANSWERED
                     await db.commit()
                     logger.info(f"Successfully processed question {question_id}")
                 else:
-                    logger.error(f"Failed to update question {question_id} - not found")
+                    # Question was deleted while it was being processed
+                    logger.warning(f"Question {question_id} no longer exists, discarding answer")
             except Exception as db_error:
                 await db.rollback()
                 logger.error(f"Database error updating question {question_id}: {str(db_error)}")
                 raise
-                
-        # Remove from background tasks
-        if question_id in background_tasks:
-            del background_tasks[question_id]
             
     except Exception as e:
         logger.error(f"Error processing question {question_id}: {str(e)}")
@@ -74,20 +128,13 @@ async def process_question_async(question_id: int, question_text: str, db_sessio
         # Update status to error
         try:
             async with db_session_factory() as db:
-                result = await db.execute(
-                    select(Question).where(Question.id == question_id)
-                )
-                question = result.scalar_one_or_none()
+                question = await db.get(Question, question_id)
                 
                 if question:
-                    question.status = QuestionStatus.ERROR.value
+                    question.status = ERROR
                     await db.commit()
         except Exception as update_error:
             logger.error(f"Failed to update error status: {str(update_error)}")
-        
-        # Remove from background tasks
-        if question_id in background_tasks:
-            del background_tasks[question_id]
 
 # Document endpoints
 @documents_router.post(
@@ -113,7 +160,6 @@ async def upload_document(
         )
         db.add(document)
         await db.commit()
-        await db.refresh(document)
         
         logger.info(f"Document created successfully: {document.id}")
         return DocumentResponse.model_validate(document)
@@ -135,13 +181,10 @@ async def upload_document(
 async def get_document(
     document_id: int,
     db: AsyncSession = Depends(get_db)
-) -> DocumentResponse:
+) -> Document:
     """Retrieve a document by its ID."""
     try:
-        result = await db.execute(
-            select(Document).where(Document.id == document_id)
-        )
-        document = result.scalar_one_or_none()
+        document = await db.get(Document, document_id)
         
         if not document:
             raise HTTPException(
@@ -149,7 +192,7 @@ async def get_document(
                 detail=f"Document with id {document_id} not found"
             )
         
-        return DocumentResponse.model_validate(document)
+        return document
     except HTTPException:
         raise
     except Exception as e:
@@ -169,43 +212,35 @@ async def get_document(
 async def submit_question(
     document_id: int,
     question_data: QuestionCreate,
+    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db)
 ) -> QuestionResponse:
     """Submit a question about a specific document."""
     try:
-        # Verify document exists
-        result = await db.execute(
-            select(Document).where(Document.id == document_id)
-        )
-        document = result.scalar_one_or_none()
-        
-        if not document:
-            raise HTTPException(
-                status_code=status.HTTP_404_NOT_FOUND,
-                detail=f"Document with id {document_id} not found"
-            )
-        
-        # Create question with pending status
+        # Create question with pending status; the foreign key on
+        # document_id doubles as the document existence check
         question = Question(
             document_id=document_id,
             question=question_data.question,
-            status=QuestionStatus.PENDING.value
+            status=PENDING
         )
         db.add(question)
-        await db.commit()
-        await db.refresh(question)
-        
-        # Start background processing
         try:
-            from .database import async_session
-            task = asyncio.create_task(
-                process_question_async(question.id, question_data.question, async_session)
+            await db.commit()
+        except IntegrityError as integrity_error:
+            if not _is_foreign_key_violation(integrity_error):
+                raise
+            await db.rollback()
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail=f"Document with id {document_id} not found"
             )
-            background_tasks[question.id] = task
-            logger.info(f"Question {question.id} submitted for processing")
-        except Exception as bg_error:
-            logger.error(f"Failed to start background task: {str(bg_error)}")
-            # Continue anyway - question was created successfully
+        
+        # Schedule background processing to run after the response is sent
+        background_tasks.add_task(
+            process_question_async, question.id, document_id, question_data.question, async_session
+        )
+        logger.info(f"Question {question.id} submitted for processing")
         
         return QuestionResponse.model_validate(question)
         
@@ -228,28 +263,23 @@ async def submit_question(
 async def get_document_questions(
     document_id: int,
     db: AsyncSession = Depends(get_db)
-) -> List[QuestionResponse]:
+) -> Sequence[RowMapping]:
     """Get all questions for a specific document."""
     try:
-        # Verify document exists
-        doc_result = await db.execute(
-            select(Document).where(Document.id == document_id)
-        )
-        document = doc_result.scalar_one_or_none()
-        
-        if not document:
+        # Fetch plain rows (no ORM objects); the response model serializes them directly
+        result = await db.execute(STMT_QUESTIONS_BY_DOC, {"document_id": document_id})
+        questions = result.mappings().all()
+        
+        # Only an empty result needs the extra existence check
+        if not questions and (
+            await db.execute(STMT_DOCUMENT_EXISTS, {"document_id": document_id})
+        ).first() is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Document with id {document_id} not found"
             )
         
-        # Get questions
-        questions_result = await db.execute(
-            select(Question).where(Question.document_id == document_id).order_by(Question.created_at.desc())
-        )
-        questions = questions_result.scalars().all()
-        
-        return [QuestionResponse.model_validate(q) for q in questions]
+        return questions
     except HTTPException:
         raise
     except Exception as e:
@@ -269,13 +299,10 @@ async def get_document_questions(
 async def get_question(
     question_id: int,
     db: AsyncSession = Depends(get_db)
-) -> QuestionResponse:
+) -> Question:
     """Get question status and answer."""
     try:
-        result = await db.execute(
-            select(Question).where(Question.id == question_id)
-        )
-        question = result.scalar_one_or_none()
+        question = await db.get(Question, question_id)
         
         if not question:
             raise HTTPException(
@@ -283,7 +310,7 @@ async def get_question(
                 detail=f"Question with id {question_id} not found"
             )
         
-        return QuestionResponse.model_validate(question)
+        return question
     except HTTPException:
         raise
     except Exception as e:
@@ -297,7 +324,7 @@ async def get_question(
     "/{question_id}",
     status_code=status.HTTP_204_NO_CONTENT,
     summary="Delete a question",
-    description="Delete a specific question (cancels processing if pending)"
+    description="Delete a specific question (any pending answer is discarded)"
 )
 async def delete_question(
     question_id: int,
@@ -305,25 +332,15 @@ async def delete_question(
 ):
     """Delete a question."""
     try:
-        result = await db.execute(
-            select(Question).where(Question.id == question_id)
-        )
-        question = result.scalar_one_or_none()
+        # Delete question
+        result = await db.execute(STMT_DELETE_QUESTION, {"question_id": question_id})
         
-        if not question:
+        if result.first() is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Question with id {question_id} not found"
             )
         
-        # Cancel background task if it exists
-        if question_id in background_tasks:
-            background_tasks[question_id].cancel()
-            del background_tasks[question_id]
-            logger.info(f"Cancelled background task for question {question_id}")
-        
-        # Delete question
-        await db.execute(delete(Question).where(Question.id == question_id))
         await db.commit()
         logger.info(f"Question {question_id} deleted successfully")
         
@@ -347,7 +364,7 @@ async def health_check(db: AsyncSession = Depends(get_db)) -> JSONResponse:
     """Health check endpoint."""
     try:
         # Test database connection with a simple query
-        await db.execute(select(1))
+        await db.execute(STMT_PING)
         
         return JSONResponse(
             status_code=status.HTTP_200_OK,
@@ -355,8 +372,7 @@ async def health_check(db: AsyncSession = Depends(get_db)) -> JSONResponse:
                 "status": "healthy",
                 "service": "document-qa-service",
                 "version": "1.0.0",
-                "database": "connected",
-                "background_tasks": len(background_tasks)
+                "database": "connected"
             }
         )
     except Exception as e:
@@ -373,26 +389,19 @@ async def health_check(db: AsyncSession = Depends(get_db)) -> JSONResponse:
 async def get_metrics(db: AsyncSession = Depends(get_db)) -> JSONResponse:
     """Get service metrics and statistics."""
     try:
-        # Get document count
-        doc_result = await db.execute(select(Document))
-        doc_count = len(doc_result.scalars().all())
-        
-        # Get question count
-        question_result = await db.execute(select(Question))
-        question_count = len(question_result.scalars().all())
+        # Get document and question counts in a single round-trip
+        counts_result = await db.execute(STMT_COUNTS)
+        doc_count, question_count = counts_result.one()
         
         metrics = {
             "total_documents": doc_count,
-            "total_questions": question_count,
-            "background_tasks_active": len(background_tasks)
+            "total_questions": question_count
         }
         
         return JSONResponse(
             status_code=status.HTTP_200_OK,
             content={
-                "metrics": metrics,
-                "background_tasks_active": len(background_tasks),
-                "background_task_ids": list(background_tasks.keys())
+                "metrics": metrics
             }
         )
     except Exception as e:
@@ -401,6 +410,38 @@ async def get_metrics(db: AsyncSession = Depends(get_db)) -> JSONResponse:
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to retrieve metrics"
         )
+
+SUPPORTED_FILE_EXTENSIONS = ('.pdf', '.docx', '.txt')
+MAX_UPLOAD_SIZE = 50 * 1024 * 1024  # 50 MB
+
+
+def _extract_text(file_obj: BinaryIO, filename: str) -> str:
+    """
+    Extract plain text from an uploaded PDF, DOCX or TXT file object.
+    CPU-bound, so it is run in a worker thread off the event loop.
+    Parser libraries are imported lazily so workers that never receive
+    file uploads don't pay their import cost.
+    """
+    file_obj.seek(0)
+    
+    if filename.endswith('.pdf'):
+        # PDF processing
+        import pypdf
+        pdf_reader = pypdf.PdfReader(file_obj)
+        return "\n".join(page.extract_text() or "" for page in pdf_reader.pages)
+            
+    elif filename.endswith('.docx'):
+        # Word document processing
+        import docx
+        doc = docx.Document(file_obj)
+        return "\n".join(paragraph.text for paragraph in doc.paragraphs)
+            
+    elif filename.endswith('.txt'):
+        # Plain text
+        return file_obj.read().decode('utf-8')
+    
+    return ""
+
 @documents_router.post(
     "/upload-file",
     response_model=DocumentResponse,
@@ -416,32 +457,23 @@ async def upload_complex_document(
     """Upload and process complex document files."""
     
     try:
-        file_content = await file.read()
-        extracted_text = ""
-        
         # Handle different file types
-        if file.filename.endswith('.pdf'):
-            # PDF processing
-            pdf_reader = PyPDF2.PdfReader(io.BytesIO(file_content))
-            for page in pdf_reader.pages:
-                extracted_text += page.extract_text() + "\n"
-                
-        elif file.filename.endswith('.docx'):
-            # Word document processing
-            doc = docx.Document(io.BytesIO(file_content))
-            for paragraph in doc.paragraphs:
-                extracted_text += paragraph.text + "\n"
-                
-        elif file.filename.endswith('.txt'):
-            # Plain text
-            extracted_text = file_content.decode('utf-8')
-            
-        else:
+        if not file.filename.endswith(SUPPORTED_FILE_EXTENSIONS):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="Unsupported file type. Use PDF, DOCX, or TXT files."
             )
         
+        if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"File too large. Maximum size is {MAX_UPLOAD_SIZE // (1024 * 1024)} MB."
+            )
+        
+        # Parse the spooled upload in place, in a worker thread so the event
+        # loop keeps serving requests
+        extracted_text = await asyncio.to_thread(_extract_text, file.file, file.filename)
+        
         if not extracted_text.strip():
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
@@ -455,7 +487,6 @@ async def upload_complex_document(
         )
         db.add(document)
         await db.commit()
-        await db.refresh(document)
         
         logger.info(f"Complex document uploaded successfully: {document.id}")
         return DocumentResponse.model_validate(document)
@@ -3,7 +3,7 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 from .models import Question, Document
 from .schemas import QuestionCreate
-from .enums import QuestionStatus
+from .enums import PENDING, ANSWERED
 
 class QuestionService:
     @staticmethod
@@ -12,11 +12,10 @@ class QuestionService:
         question = Question(
             document_id=document_id,
             question=question_data.question,
-            status=QuestionStatus.PENDING.value
+            status=PENDING
         )
         db.add(question)
         await db.commit()
-        await db.refresh(question)
         return question
 
     @staticmethod
@@ -29,7 +28,7 @@ class QuestionService:
         
         if question:
             question.answer = answer
-            question.status = QuestionStatus.ANSWERED.value
+            question.status = ANSWERED
             await db.commit()
             await db.refresh(question)
         
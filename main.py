@@ -1,9 +1,11 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.database import create_tables
+from app.database import create_tables, engine
 from app.schemas import HealthResponse
 from datetime import datetime
+import asyncio
 import logging
+import os
 import uvicorn
 
 # 👇 THIS LINE: update to import directly from routers.py
@@ -41,6 +43,11 @@ async def startup():
     logger.info("Running startup tasks...")
     await create_tables()
 
+async def prepare_database():
+    """Create the schema, then release pooled connections bound to this event loop"""
+    await create_tables()
+    await engine.dispose()
+
 @app.get("/")
 async def root():
     return {"message": "Document Q&A Service is running."}
@@ -51,4 +58,10 @@ async def health():
 
 # Entry point
 if __name__ == "__main__":
-    uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
+    # DEBUG=1 runs a single auto-reloading process; otherwise use one worker per core
+    if os.getenv("DEBUG") == "1":
+        uvicorn.run("main:app", host="127.0.0.1", port=8000, reload=True)
+    else:
+        # Create the schema once up front so the workers' startup hooks find it in place
+        asyncio.run(prepare_database())
+        uvicorn.run("main:app", host="127.0.0.1", port=8000, workers=os.cpu_count() or 1)